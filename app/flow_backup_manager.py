@@ -2,11 +2,120 @@ import os
 import requests
 import json
 import logging
-import xmltodict
+import ijson
+from decimal import Decimal
+from xml.sax.saxutils import escape
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Size of the chunks pulled from the Tooling API response while streaming flow metadata
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class FlowMetadataStreamWriter:
+    """Writes the prettified JSON and Flow XML backup files from ijson parse events.
+
+    Only the current nesting path is kept in memory, so the size of a flow version
+    being backed up no longer determines how much memory the backup needs.
+    """
+
+    def __init__(self, json_file, xml_file, indent=4, xml_indent='\t'):
+        self.json_file = json_file
+        self.xml_file = xml_file
+        self.indent = ' ' * indent
+        self.xml_indent = xml_indent
+        # One entry per open JSON container: [container type, has items, XML tag of its items]
+        self.json_stack = []
+        # One entry per open XML element: [tag, depth, has children]
+        self.xml_stack = []
+        self.xml_key = 'Flow'
+
+    def start(self):
+        self.xml_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+
+    def finish(self):
+        self.json_file.flush()
+        self.xml_file.flush()
+
+    def handle_event(self, prefix, event, value):
+        if event == 'map_key':
+            self.write_json_key(value)
+            self.xml_key = value
+        elif event in ('start_map', 'start_array'):
+            self.write_json_value_separator()
+            tag = self.current_xml_tag()
+            self.json_file.write('{' if event == 'start_map' else '[')
+            self.json_stack.append([event, False, tag])
+            if event == 'start_map':
+                self.open_xml_element(tag)
+        elif event in ('end_map', 'end_array'):
+            container = self.json_stack.pop()
+            if container[1]:
+                self.json_file.write('\n' + self.indent * len(self.json_stack))
+            self.json_file.write('}' if event == 'end_map' else ']')
+            if event == 'end_map':
+                self.close_xml_element()
+        else:
+            # ijson returns integer literals as int and everything else as Decimal, which
+            # json.loads would have read as float; use_float is avoided because the C
+            # backend then rejects integers that do not fit in 64 bits
+            if isinstance(value, Decimal):
+                value = float(value)
+            self.write_json_value_separator()
+            self.json_file.write(json.dumps(value))
+            self.write_xml_scalar(self.current_xml_tag(), value)
+
+    def write_json_key(self, key):
+        container = self.json_stack[-1]
+        self.json_file.write((',' if container[1] else '') + '\n' + self.indent * len(self.json_stack) + json.dumps(key) + ': ')
+        container[1] = True
+
+    def write_json_value_separator(self):
+        # Map values follow their key on the same line; array items each get a line
+        if self.json_stack and self.json_stack[-1][0] == 'start_array':
+            container = self.json_stack[-1]
+            self.json_file.write((',' if container[1] else '') + '\n' + self.indent * len(self.json_stack))
+            container[1] = True
+
+    def current_xml_tag(self):
+        # Like xmltodict, every item of a list is written as a repeated element named after its key
+        if self.json_stack and self.json_stack[-1][0] == 'start_array':
+            return self.json_stack[-1][2]
+        return self.xml_key
+
+    def mark_xml_parent(self):
+        # Mirrors xmltodict's pretty printing: a parent breaks its line only once it has children
+        if self.xml_stack and not self.xml_stack[-1][2]:
+            self.xml_stack[-1][2] = True
+            self.xml_file.write('\n')
+
+    def open_xml_element(self, tag):
+        self.mark_xml_parent()
+        depth = len(self.xml_stack)
+        self.xml_file.write(f"{self.xml_indent * depth}<{tag}>")
+        self.xml_stack.append([tag, depth, False])
+
+    def close_xml_element(self):
+        tag, depth, has_children = self.xml_stack.pop()
+        if has_children:
+            self.xml_file.write(self.xml_indent * depth)
+        self.xml_file.write(f"</{tag}>")
+        if depth:
+            self.xml_file.write('\n')
+
+    def write_xml_scalar(self, tag, value):
+        self.mark_xml_parent()
+        if value is None:
+            text = ''
+        elif isinstance(value, bool):
+            text = 'true' if value else 'false'
+        else:
+            text = escape(str(value))
+        depth = len(self.xml_stack)
+        self.xml_file.write(f"{self.xml_indent * depth}<{tag}>{text}</{tag}>\n")
+
+
 class FlowBackupManager:
     def __init__(self, instance_url, headers):
         self.instance_url = instance_url
@@ -58,25 +167,8 @@ class FlowBackupManager:
             file.write(flow_def_xml)
 
         for version in flow_versions:
-            version_metadata = self.retrieve_flow_version_metadata(version['Id'])
-            if version_metadata:
-                version_path = os.path.join(flow_dir, f"{flow_api_name}-{version['VersionNumber']}.flow")
-                
-                # Save prettified JSON
-                prettified_json = json.dumps(version_metadata, indent=4)
-                with open(version_path + ".json", "w") as json_file:
-                    json_file.write(prettified_json)
-                
-                # Convert JSON to XML and save
-                try:
-                    xml_data = xmltodict.unparse({'Flow': version_metadata}, pretty=True)
-                    modified_xml = f'<?xml version="1.0" encoding="UTF-8"?>\n{xml_data}'
-                    with open(version_path, "w") as xml_file:
-                        xml_file.write(modified_xml)
-                except Exception as e:
-                    logging.error(f"Error converting JSON to XML: {e}")
-                    text_area.append(f"Error converting JSON to XML for version {version['VersionNumber']}. Skipping backup.\n")
-            else:
+            version_path = os.path.join(flow_dir, f"{flow_api_name}-{version['VersionNumber']}.flow")
+            if not self.stream_flow_version_metadata(version['Id'], version_path):
                 text_area.append(f"Failed to retrieve metadata for version {version['VersionNumber']}. Skipping backup.\n")
 
 
@@ -95,11 +187,43 @@ class FlowBackupManager:
         # Placeholder: return a full XML string as per Salesforce Metadata API requirements
         return "<Flow>...</Flow>"
 
-    def retrieve_flow_version_metadata(self, version_id):
+    def stream_flow_version_metadata(self, version_id, version_path):
+        """Streams a flow version from the Tooling API straight into its .flow and .flow.json files.
+
+        The response body is parsed incrementally as it arrives instead of being loaded
+        with response.json(), so peak memory per version stays bounded by the chunk size
+        and nesting depth rather than by the size of the flow.
+        """
         retrieve_url = f"{self.instance_url}/services/data/v52.0/tooling/sobjects/Flow/{version_id}"
-        response = requests.get(retrieve_url, headers=self.headers)
-        if response.status_code == 200:
-            return response.json()  # Ensure this JSON is correctly formatted as expected by xmltodict
-        else:
-            logging.error(f"Failed to retrieve metadata for version ID {version_id}: HTTP {response.status_code}")
-            return None
\ No newline at end of file
+        json_path = version_path + ".json"
+        # Write to temporary files so an earlier backup in the same directory survives a failed download
+        temp_json_path = json_path + ".part"
+        temp_version_path = version_path + ".part"
+        try:
+            with requests.get(retrieve_url, headers=self.headers, stream=True) as response:
+                if response.status_code != 200:
+                    logging.error(f"Failed to retrieve metadata for version ID {version_id}: HTTP {response.status_code}")
+                    return False
+                with open(temp_json_path, "w", encoding="utf-8") as json_file, open(temp_version_path, "w", encoding="utf-8") as xml_file:
+                    writer = FlowMetadataStreamWriter(json_file, xml_file)
+                    writer.start()
+                    events = ijson.sendable_list()
+                    parser = ijson.parse_coro(events)
+                    for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                        parser.send(chunk)
+                        for prefix, event, value in events:
+                            writer.handle_event(prefix, event, value)
+                        del events[:]
+                    parser.close()
+                    for prefix, event, value in events:
+                        writer.handle_event(prefix, event, value)
+                    writer.finish()
+            os.replace(temp_json_path, json_path)
+            os.replace(temp_version_path, version_path)
+            return True
+        except Exception as e:
+            logging.error(f"Error streaming metadata for version ID {version_id}: {e}")
+            for path in (temp_json_path, temp_version_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return False
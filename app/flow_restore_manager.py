@@ -0,0 +1,392 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tarfile
+import zipfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import ijson
+import requests
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+API_PATH = "/services/data/v52.0/tooling"
+# The Tooling API composite resource accepts at most 25 subrequests per call
+MAX_BATCH_SIZE = 25
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_MAX_WORKERS = 4
+# Flow names per org version query, keeping the GET URL well under Salesforce's URI length limit
+ORG_QUERY_CHUNK_SIZE = 100
+
+# Backed-up metadata fields compared with the queryable fields of the org's versions
+COMPARED_FIELDS = {
+    'Metadata.label': 'MasterLabel',
+    'Metadata.processType': 'ProcessType',
+    'Metadata.apiVersion': 'ApiVersion',
+    'Metadata.description': 'Description',
+}
+# Metadata fields left out of the content hash; status changes when a version is activated or restored
+UNHASHED_FIELDS = {'status'}
+
+
+class FlowRestoreManager:
+    """Restores flow versions written by FlowBackupManager into an org.
+
+    A restore is planned first with plan_restore() and then carried out with
+    restore_plan(). Salesforce assigns version numbers on creation, so backup
+    versions are matched to org versions by content rather than by number, and
+    restored versions are added after the versions already in the org.
+
+    Restored versions are created as Draft. A flow's backed-up active version is
+    only activated again if the org has no active version of that flow and the
+    caller opts in with restore_plan(activate=True).
+    """
+
+    def __init__(self, instance_url, headers, batch_size=DEFAULT_BATCH_SIZE, max_workers=DEFAULT_MAX_WORKERS):
+        self.instance_url = instance_url.rstrip('/')
+        self.headers = headers
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+
+    def plan_restore(self, backup_path):
+        """Scans a backup directory or archive and works out which versions the org lacks.
+
+        A backed-up version is planned only if no org version of the same flow has
+        equivalent metadata. Returns a plan dict with the versions to restore
+        grouped into dependency layers, or None if the backup cannot be read. Pass
+        the plan to restore_plan(), or to cleanup_plan() if the restore is abandoned.
+        """
+        if not os.path.exists(backup_path):
+            logging.error(f"Backup does not exist: {backup_path}")
+            return None
+
+        temp_dir = None
+        if os.path.isdir(backup_path):
+            backup_dir = backup_path
+        else:
+            temp_dir = tempfile.mkdtemp(prefix="flow_restore_")
+            try:
+                self.unpack_archive(backup_path, temp_dir)
+            except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as e:
+                logging.error(f"Could not unpack backup archive {backup_path}: {e}")
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                return None
+            backup_dir = temp_dir
+
+        plan = {'backup_dir': backup_dir, 'temp_dir': temp_dir, 'versions': [], 'layers': [], 'unchanged': 0,
+                'reactivations': [], 'activation_flows': []}
+        try:
+            backed_up = self.scan_backup(backup_dir)
+            if not backed_up:
+                logging.warning(f"No flow versions found in backup: {backup_path}")
+                return plan
+
+            org_versions = self.retrieve_org_versions({version['api_name'] for version in backed_up})
+            org_hashes = self.retrieve_org_metadata_hashes(backed_up, org_versions)
+            for version in backed_up:
+                flow_org_versions = org_versions.get(version['api_name'], [])
+                equivalent = self.find_equivalent_version(version, flow_org_versions, org_hashes)
+                # Activating a version demotes the org's active one, so only flows with no active version qualify
+                can_activate = version['active'] and not any(record.get('Status') == 'Active' for record in flow_org_versions)
+                if equivalent is not None:
+                    if can_activate:
+                        plan['reactivations'].append({'api_name': version['api_name'], 'definition_id': equivalent['DefinitionId'],
+                                                      'version_number': int(equivalent['VersionNumber'])})
+                    plan['unchanged'] += 1
+                    continue
+                version['activate'] = can_activate
+                numbers = {int(record['VersionNumber']) for record in flow_org_versions}
+                version['reason'] = 'different' if version['version_number'] in numbers else 'missing'
+                plan['versions'].append(version)
+        except Exception:
+            self.cleanup_plan(plan)
+            raise
+
+        plan['layers'] = self.order_by_dependency(plan['versions'])
+        plan['activation_flows'] = sorted({version['api_name'] for version in plan['versions'] if version['activate']}
+                                          | {reactivation['api_name'] for reactivation in plan['reactivations']})
+        return plan
+
+    def unpack_archive(self, archive_path, target_dir):
+        if tarfile.is_tarfile(archive_path):
+            with tarfile.open(archive_path) as archive:
+                if hasattr(tarfile, 'data_filter'):
+                    archive.extractall(target_dir, filter='data')
+                else:
+                    # Older Pythons have no extraction filters, so refuse anything that could land outside target_dir
+                    for member in archive.getmembers():
+                        parts = member.name.replace('\\', '/').split('/')
+                        if os.path.isabs(member.name) or '..' in parts or not (member.isfile() or member.isdir()):
+                            raise ValueError(f"Unsafe archive member: {member.name}")
+                    archive.extractall(target_dir)
+        elif zipfile.is_zipfile(archive_path):
+            # ZipFile.extractall already strips absolute paths and '..' components
+            with zipfile.ZipFile(archive_path) as archive:
+                archive.extractall(target_dir)
+        else:
+            raise ValueError("Not a zip or tar archive")
+
+    def scan_backup(self, backup_dir):
+        versions = []
+        for root, _, files in os.walk(backup_dir):
+            if os.path.basename(root) != "flows":
+                continue
+            for file_name in sorted(files):
+                if not file_name.endswith(".flow.json"):
+                    continue
+                api_name, _, version_number = file_name[:-len(".flow.json")].rpartition('-')
+                if not api_name or not version_number.isdigit():
+                    logging.warning(f"Skipping unrecognised backup file: {file_name}")
+                    continue
+                version = self.scan_version_file(os.path.join(root, file_name))
+                if version is None:
+                    continue
+                version['api_name'] = api_name
+                version['version_number'] = int(version_number)
+                versions.append(version)
+        return versions
+
+    def scan_version_file(self, path):
+        # Only the fields needed for planning are kept; the metadata itself is read again when needed
+        version = {'path': path, 'subflows': set(), 'fields': {}, 'active': False, 'activate': False, 'hash': None}
+        has_metadata = False
+        try:
+            with open(path, "rb") as file:
+                for prefix, event, value in ijson.parse(file):
+                    if prefix == 'Metadata' and event == 'start_map':
+                        has_metadata = True
+                    elif prefix == 'Metadata.subflows.item.flowName' and value:
+                        version['subflows'].add(value)
+                    elif prefix == 'Metadata.status':
+                        version['active'] = value == 'Active'
+                    elif prefix in COMPARED_FIELDS and event != 'start_map':
+                        version['fields'][COMPARED_FIELDS[prefix]] = value
+        except (OSError, ijson.JSONError) as e:
+            logging.error(f"Could not read backup file {path}: {e}")
+            return None
+        if not has_metadata:
+            logging.warning(f"Skipping backup file without flow metadata: {path}")
+            return None
+        return version
+
+    def retrieve_org_versions(self, api_names):
+        """Fetches every existing version of the backed-up flows, one paged Tooling query per group of names."""
+        names = sorted(api_names)
+        org_versions = {}
+        for start in range(0, len(names), ORG_QUERY_CHUNK_SIZE):
+            quoted = ", ".join("'" + name.replace("\\", "\\\\").replace("'", "\\'") + "'" for name in names[start:start + ORG_QUERY_CHUNK_SIZE])
+            query = f"SELECT Id, DefinitionId, VersionNumber, Status, {', '.join(COMPARED_FIELDS.values())}, Definition.DeveloperName FROM Flow WHERE Definition.DeveloperName IN ({quoted})"
+            url = f"{self.instance_url}{API_PATH}/query/?q={requests.utils.quote(query)}"
+            while url:
+                response = self.session.get(url)
+                response.raise_for_status()
+                data = response.json()
+                for record in data.get('records', []):
+                    api_name = (record.get('Definition') or {}).get('DeveloperName')
+                    org_versions.setdefault(api_name, []).append(record)
+                next_url = data.get('nextRecordsUrl')
+                url = f"{self.instance_url}{next_url}" if next_url else None
+        return org_versions
+
+    def retrieve_org_metadata_hashes(self, backed_up, org_versions):
+        """Hashes the metadata of every org version whose queryable fields match a backed-up version.
+
+        The Metadata field cannot be queried for many rows at once, so each candidate
+        is fetched on its own, on up to max_workers threads.
+        """
+        candidate_ids = set()
+        for version in backed_up:
+            for record in org_versions.get(version['api_name'], []):
+                if self.matches_org_fields(version, record):
+                    candidate_ids.add(record['Id'])
+        if not candidate_ids:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(candidate_ids, executor.map(self.retrieve_org_metadata_hash, candidate_ids)))
+
+    def retrieve_org_metadata_hash(self, version_id):
+        response = self.session.get(f"{self.instance_url}{API_PATH}/sobjects/Flow/{version_id}")
+        response.raise_for_status()
+        return self.metadata_hash(response.json().get('Metadata') or {})
+
+    def find_equivalent_version(self, version, flow_org_versions, org_hashes):
+        candidates = [record for record in flow_org_versions if self.matches_org_fields(version, record)]
+        if not candidates:
+            return None
+        if version['hash'] is None:
+            try:
+                with open(version['path'], "r", encoding="utf-8") as file:
+                    version['hash'] = self.metadata_hash(json.load(file)['Metadata'])
+            except (OSError, ValueError, KeyError) as e:
+                logging.error(f"Could not read backup file {version['path']}: {e}")
+                return None
+        return next((record for record in candidates if org_hashes.get(record['Id']) == version['hash']), None)
+
+    def matches_org_fields(self, version, org_version):
+        for field, value in version['fields'].items():
+            org_value = org_version.get(field)
+            if field == 'ApiVersion':
+                if value is not None and org_value is not None and float(value) != float(org_value):
+                    return False
+            elif (value or None) != (org_value or None):
+                return False
+        return True
+
+    def metadata_hash(self, metadata):
+        metadata = {key: value for key, value in metadata.items() if key not in UNHASHED_FIELDS}
+        canonical = json.dumps(self.strip_empty(metadata), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def strip_empty(self, value):
+        # The API may omit or null out unset fields, so they must not affect the hash
+        if isinstance(value, dict):
+            stripped = {key: self.strip_empty(item) for key, item in value.items()}
+            return {key: item for key, item in stripped.items() if item not in (None, [], {})}
+        if isinstance(value, list):
+            return [self.strip_empty(item) for item in value]
+        return value
+
+    def order_by_dependency(self, versions):
+        """Groups versions into layers so that subflows are created before the flows calling them."""
+        by_flow = {}
+        for version in versions:
+            by_flow.setdefault(version['api_name'], []).append(version)
+        for flow_versions in by_flow.values():
+            flow_versions.sort(key=lambda v: v['version_number'])
+
+        # Only subflows that are part of this restore need to come first
+        dependencies = {
+            api_name: {sub for v in flow_versions for sub in v['subflows'] if sub in by_flow and sub != api_name}
+            for api_name, flow_versions in by_flow.items()
+        }
+        layers = []
+        done = set()
+        remaining = set(by_flow)
+        while remaining:
+            ready = sorted(name for name in remaining if dependencies[name] <= done)
+            if not ready:
+                logging.warning(f"Circular subflow references between: {', '.join(sorted(remaining))}")
+                ready = sorted(remaining)
+            layers.append([by_flow[name] for name in ready])
+            done.update(ready)
+            remaining.difference_update(ready)
+        return layers
+
+    def restore_plan(self, plan, progress=None, activate=False):
+        """Creates the planned flow versions and returns one result dict per version.
+
+        Flows within a dependency layer are sent in batched composite calls on up to
+        max_workers threads. Versions of the same flow are sent in separate rounds so
+        they are created in their original order. With activate=True the flows in
+        plan['activation_flows'] get their backed-up active version activated again.
+        progress is called on the calling thread as progress(completed, total, result)
+        after each version finishes.
+        """
+        results = []
+        reactivations = plan['reactivations'] if activate else []
+        total = len(plan['versions']) + len(reactivations)
+
+        def collect(futures):
+            for future in as_completed(futures):
+                for result in future.result():
+                    results.append(result)
+                    if progress:
+                        progress(len(results), total, result)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for layer in plan['layers']:
+                    rounds = max(len(flow_versions) for flow_versions in layer)
+                    for index in range(rounds):
+                        round_versions = [flow_versions[index] for flow_versions in layer if index < len(flow_versions)]
+                        batches = [round_versions[i:i + self.batch_size] for i in range(0, len(round_versions), self.batch_size)]
+                        collect([executor.submit(self.create_batch, batch, activate) for batch in batches])
+                batches = [reactivations[i:i + self.batch_size] for i in range(0, len(reactivations), self.batch_size)]
+                collect([executor.submit(self.reactivate_batch, batch) for batch in batches])
+        finally:
+            self.cleanup_plan(plan)
+        return results
+
+    def create_batch(self, batch, activate=False):
+        results = []
+        pending = []
+        for version in batch:
+            result = {'api_name': version['api_name'], 'version_number': version['version_number'],
+                      'reason': version['reason'], 'success': False, 'id': None, 'error': None}
+            results.append(result)
+            try:
+                body = self.build_flow_body(version, activate)
+            except (OSError, ValueError, KeyError) as e:
+                result['error'] = f"Could not read backup file: {e}"
+                continue
+            pending.append((result, {
+                'method': 'POST',
+                'url': f"{API_PATH}/sobjects/Flow",
+                'referenceId': f"{version['api_name']}_v{version['version_number']}",
+                'body': body,
+            }))
+        self.send_composite(pending)
+        return results
+
+    def reactivate_batch(self, batch):
+        pending = []
+        for reactivation in batch:
+            result = {'api_name': reactivation['api_name'], 'version_number': reactivation['version_number'],
+                      'reason': 'reactivated', 'success': False, 'id': None, 'error': None}
+            pending.append((result, {
+                'method': 'PATCH',
+                'url': f"{API_PATH}/sobjects/FlowDefinition/{reactivation['definition_id']}",
+                'referenceId': f"{reactivation['api_name']}_activate",
+                'body': {'Metadata': {'activeVersionNumber': reactivation['version_number']}},
+            }))
+        self.send_composite(pending)
+        return [result for result, _ in pending]
+
+    def send_composite(self, pending):
+        """Sends (result, subrequest) pairs in one composite call and fills in each result."""
+        if not pending:
+            return
+        requests_by_ref = {request['referenceId']: result for result, request in pending}
+        try:
+            response = self.session.post(f"{self.instance_url}{API_PATH}/composite",
+                                         json={'allOrNone': False, 'compositeRequest': [request for _, request in pending]})
+            response.raise_for_status()
+            sub_responses = response.json().get('compositeResponse', [])
+        except (requests.RequestException, ValueError) as e:
+            logging.error(f"Composite restore request failed: {e}")
+            for result in requests_by_ref.values():
+                result['error'] = str(e)
+            return
+
+        for sub_response in sub_responses:
+            result = requests_by_ref.get(sub_response.get('referenceId'))
+            if result is None:
+                continue
+            body = sub_response.get('body')
+            if 200 <= sub_response.get('httpStatusCode', 0) < 300:
+                result['success'] = True
+                result['id'] = body.get('id') if isinstance(body, dict) else None
+            else:
+                errors = body if isinstance(body, list) else [body]
+                result['error'] = "; ".join(str(error.get('message', error)) if isinstance(error, dict) else str(error) for error in errors)
+        for result in requests_by_ref.values():
+            if not result['success'] and result['error'] is None:
+                result['error'] = "No response returned for this version"
+
+    def build_flow_body(self, version, activate=False):
+        with open(version['path'], "r", encoding="utf-8") as file:
+            metadata = json.load(file)['Metadata']
+        # Older versions were backed up as Obsolete, which cannot be created, and activating
+        # a version would demote whatever is live in the org, so Draft unless activation was opted into
+        metadata['status'] = 'Active' if activate and version['activate'] else 'Draft'
+        return {'FullName': version['api_name'], 'Metadata': metadata}
+
+    def cleanup_plan(self, plan):
+        if plan and plan.get('temp_dir'):
+            shutil.rmtree(plan['temp_dir'], ignore_errors=True)
+            plan['temp_dir'] = None
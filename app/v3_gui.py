@@ -4,6 +4,7 @@ import requests
 import configparser
 import logging
 from flow_backup_manager import FlowBackupManager
+from flow_restore_manager import FlowRestoreManager
 from prettytable import PrettyTable
 from PyQt5.QtWidgets import (
     QApplication, QDialogButtonBox, QDialog, QMainWindow, QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout,
@@ -31,6 +32,7 @@ class App(QMainWindow):
         self.flow_vars = {}
         self.progress_bar = None  # Add progress bar attribute
         self.backup_manager = None
+        self.restore_manager = None
         self.create_widgets()
         self.load_last_config()
         self.setup_logging()
@@ -73,6 +75,17 @@ class App(QMainWindow):
         backup_button.clicked.connect(self.backup_selected_flows)
         main_layout.addWidget(backup_button)
 
+        # Create restore buttons
+        restore_frame = QFrame()
+        restore_layout = QHBoxLayout(restore_frame)
+        restore_dir_button = QPushButton("Restore Flows From Backup Directory")
+        restore_dir_button.clicked.connect(self.restore_flows_from_directory)
+        restore_archive_button = QPushButton("Restore Flows From Backup Archive")
+        restore_archive_button.clicked.connect(self.restore_flows_from_archive)
+        restore_layout.addWidget(restore_dir_button)
+        restore_layout.addWidget(restore_archive_button)
+        main_layout.addWidget(restore_frame)
+
 
         # Splitter for Checkbox Frame and Output Frame
         splitter = QSplitter(Qt.Vertical)
@@ -146,9 +159,86 @@ class App(QMainWindow):
 
         self.scroll_to_bottom()
 
+    def restore_flows_from_directory(self):
+        backup_dir = QFileDialog.getExistingDirectory(self, "Select Backup Directory")
+        if backup_dir:
+            self.restore_flows(backup_dir)
+        else:
+            self.text_area.append("Restore cancelled.\n")
+            self.scroll_to_bottom()
+
+    def restore_flows_from_archive(self):
+        archive_path, _ = QFileDialog.getOpenFileName(self, "Select Backup Archive", "", "Backup Archives (*.zip *.tar *.tar.gz *.tgz)")
+        if archive_path:
+            self.restore_flows(archive_path)
+        else:
+            self.text_area.append("Restore cancelled.\n")
+            self.scroll_to_bottom()
 
+    def restore_flows(self, backup_path):
+        if not self.restore_manager:
+            QMessageBox.critical(self, "Error", "Please load a config file first.")
+            return
 
+        try:
+            plan = self.restore_manager.plan_restore(backup_path)
+        except Exception as e:
+            self.text_area.append(f"Error: Failed to compare the backup with the org: {str(e)}\n")
+            self.scroll_to_bottom()
+            return
+        if plan is None:
+            self.text_area.append(f"Error: Could not read backup: {backup_path}\n")
+            self.scroll_to_bottom()
+            return
 
+        versions = plan['versions']
+        activation_flows = plan['activation_flows']
+        if not versions and not activation_flows:
+            self.restore_manager.cleanup_plan(plan)
+            self.text_area.append(f"Nothing to restore. {plan['unchanged']} backed-up flow versions already match the org.\n")
+            self.scroll_to_bottom()
+            return
+
+        missing = sum(1 for version in versions if version['reason'] == 'missing')
+        flow_count = len({version['api_name'] for version in versions})
+        message = f"Restore {len(versions)} flow versions across {flow_count} flows ({missing} missing, {len(versions) - missing} different from the org) as Draft versions?"
+        if activation_flows:
+            message += f"\n\n{len(activation_flows)} of the backed-up flows have no active version in the org. You will be asked next whether to reactivate them."
+        confirmation = QMessageBox.question(self, "Confirm Restore", message, QMessageBox.Yes | QMessageBox.No)
+        if confirmation != QMessageBox.Yes:
+            self.restore_manager.cleanup_plan(plan)
+            self.text_area.append("Restore cancelled.\n")
+            self.scroll_to_bottom()
+            return
+
+        activate = False
+        if activation_flows:
+            activation = QMessageBox.question(self, "Confirm Reactivation", f"Reactivate the backed-up active version of {len(activation_flows)} flows that have no active version in the org?\n\n{', '.join(activation_flows)}", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            activate = activation == QMessageBox.Yes
+
+        self.progress_bar.show()
+        self.progress_bar.setValue(0)
+        try:
+            results = self.restore_manager.restore_plan(plan, self.report_restore_progress, activate=activate)
+        except Exception as e:
+            self.text_area.append(f"Error: Restore stopped before all flow versions were sent: {str(e)}\n")
+            self.scroll_to_bottom()
+            return
+        restored = sum(1 for result in results if result['success'])
+        self.text_area.append(f"Restore completed: {restored} of {len(results)} flow version restores and reactivations succeeded.\n")
+        self.scroll_to_bottom()
+
+    def report_restore_progress(self, completed, total, result):
+        self.progress_bar.setValue(int(completed / total * 100))
+        if result['success'] and result['reason'] == 'reactivated':
+            self.text_area.append(f"Reactivated {result['api_name']} version {result['version_number']}.\n")
+        elif result['success']:
+            self.text_area.append(f"Restored {result['api_name']} version {result['version_number']} ({result['reason']}) as '{result['id']}'.\n")
+        else:
+            action = "reactivate" if result['reason'] == 'reactivated' else "restore"
+            self.text_area.append(f"Failed to {action} {result['api_name']} version {result['version_number']}: {result['error']}\n")
+        self.scroll_to_bottom()
+        QApplication.processEvents()
 
     def query_all_flows(self):
         if self.config:
@@ -515,6 +605,7 @@ class App(QMainWindow):
         self.session_id = self.config.get('Salesforce', 'session_id')
         self.headers = {'Authorization': f'Bearer {self.session_id}', 'Content-Type': 'application/json'}
         self.backup_manager = FlowBackupManager(self.instance_url, self.headers)  # Initialize here
+        self.restore_manager = FlowRestoreManager(self.instance_url, self.headers)
         self.text_area.append(f"Loaded config file: {config_path}\n")
         self.update_connection_status()
 
@@ -0,0 +1,115 @@
+"""Compares peak memory of the old and the streaming flow version backup.
+
+Serves a generated multi-megabyte screen flow from a local HTTP server and backs
+it up twice: once the way backup_flow used to (response.json() followed by
+json.dumps and xmltodict.unparse), and once with
+FlowBackupManager.stream_flow_version_metadata. Peak memory is measured with
+tracemalloc.
+
+    python scripts/benchmark_backup_memory.py --screens 2000
+
+The old path needs xmltodict, which the app itself no longer depends on.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "app"))
+from flow_backup_manager import FlowBackupManager  # noqa: E402
+
+
+def generate_flow(screens):
+    rnd = random.Random(1)
+    return {
+        "attributes": {"type": "Flow", "url": "/services/data/v52.0/tooling/sobjects/Flow/301000000000001"},
+        "Id": "301000000000001",
+        "FullName": "Benchmark_Screen_Flow-1",
+        "Metadata": {
+            "apiVersion": 52.0,
+            "label": "Benchmark Screen Flow",
+            "processType": "Flow",
+            "status": "Active",
+            "description": None,
+            "screens": [{
+                "name": f"Screen_{i}",
+                "locationX": i,
+                "locationY": i * 1.5,
+                "fields": [{
+                    "fieldText": "x" * rnd.randint(50, 400),
+                    "isRequired": bool(i % 2),
+                    "inputParameters": [{"name": "value", "value": {"stringValue": f"Value {i}"}}],
+                } for _ in range(5)],
+            } for i in range(screens)],
+        },
+    }
+
+
+def serve(body):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def backup_in_memory(instance_url, version_path):
+    import xmltodict
+    response = requests.get(f"{instance_url}/services/data/v52.0/tooling/sobjects/Flow/301000000000001")
+    version_metadata = response.json()
+    with open(version_path + ".json", "w", encoding="utf-8") as json_file:
+        json_file.write(json.dumps(version_metadata, indent=4))
+    xml_data = xmltodict.unparse({'Flow': version_metadata}, pretty=True)
+    with open(version_path, "w", encoding="utf-8") as xml_file:
+        xml_file.write(f'<?xml version="1.0" encoding="UTF-8"?>\n{xml_data}')
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--screens", type=int, default=2000, help="screens in the generated flow (2000 is about 3.6 MB)")
+    args = parser.parse_args()
+
+    body = json.dumps(generate_flow(args.screens)).encode()
+    server = serve(body)
+    instance_url = f"http://127.0.0.1:{server.server_port}"
+    manager = FlowBackupManager(instance_url, {})
+    print(f"Flow size: {len(body) / 1e6:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        try:
+            peak = measure(backup_in_memory, instance_url, os.path.join(temp_dir, "old.flow"))
+            print(f"response.json() + json.dumps/xmltodict peak: {peak / 1e6:.1f} MB")
+        except ImportError:
+            print("xmltodict is not installed; skipping the old backup path")
+        peak = measure(manager.stream_flow_version_metadata, "301000000000001", os.path.join(temp_dir, "new.flow"))
+        print(f"stream_flow_version_metadata peak: {peak / 1e6:.1f} MB")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Runs FlowRestoreManager against a local mock of the Tooling API.
+
+The mock org holds only the latest version of each of 300 flows, as it would
+after pruning, while the generated backup holds 3 versions of each. A few flows
+have no active version left in the org, and one was deleted entirely. The
+script checks that:
+
+- the missing versions are planned and restored, with subflows created first;
+- restored versions are Draft and never replace a flow's active version;
+- flows without an active version are reactivated only when asked to;
+- Salesforce-style renumbering does not make a second plan restore them again;
+- the same backup restores from a zip archive;
+- unsafe tar archives and backup files without metadata are rejected.
+
+    python scripts/check_restore_mock_api.py
+
+Exits non-zero if a check fails.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import tarfile
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "app"))
+from flow_restore_manager import FlowRestoreManager, API_PATH  # noqa: E402
+
+FLOW_COUNT = 300
+VERSIONS_PER_FLOW = 3
+QUERY_PAGE_SIZE = 200
+MAX_URI_LENGTH = 16384
+# Flows whose remaining org version is Obsolete, and the flow missing from the org entirely
+INACTIVE_FLOWS = {"Flow_5", "Flow_105", "Flow_205"}
+DELETED_FLOW = "Flow_299"
+
+
+def flow_metadata(index, version, status):
+    # Every tenth flow starts a new chain, so the plan has ten dependency layers
+    subflows = [] if index % 10 == 9 else [{"name": "Call_Next", "flowName": f"Flow_{index + 1}"}]
+    return {
+        "label": f"Flow {index}",
+        "processType": "Flow",
+        "apiVersion": 52.0,
+        "description": None,
+        "status": status,
+        "subflows": subflows,
+        "screens": [{"name": f"Screen_{version}", "fieldText": f"Version {version} of flow {index}"}],
+    }
+
+
+class MockOrg:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = {}
+        self.created = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.max_uri_length = 0
+        self.next_id = 1
+
+    def add_version(self, api_name, metadata):
+        with self.lock:
+            flow_versions = self.versions.setdefault(api_name, [])
+            if metadata.get("status") == "Active":
+                self.demote_active(flow_versions)
+            record = {
+                "Id": f"301{self.next_id:012d}",
+                "DefinitionId": f"300{api_name}",
+                "VersionNumber": len(flow_versions) + 1,
+                "Status": metadata.get("status"),
+                "MasterLabel": metadata.get("label"),
+                "ProcessType": metadata.get("processType"),
+                "ApiVersion": metadata.get("apiVersion"),
+                "Description": metadata.get("description"),
+                "Definition": {"DeveloperName": api_name},
+                "Metadata": metadata,
+            }
+            self.next_id += 1
+            flow_versions.append(record)
+            return record
+
+    def demote_active(self, flow_versions):
+        for record in flow_versions:
+            if record["Status"] == "Active":
+                record["Status"] = "Obsolete"
+
+    def activate(self, definition_id, version_number):
+        with self.lock:
+            flow_versions = self.versions[definition_id[len("300"):]]
+            self.demote_active(flow_versions)
+            flow_versions[version_number - 1]["Status"] = "Active"
+
+    def active_versions(self):
+        return {api_name: [r["VersionNumber"] for r in flow_versions if r["Status"] == "Active"]
+                for api_name, flow_versions in self.versions.items()}
+
+    def find(self, version_id):
+        for flow_versions in self.versions.values():
+            for record in flow_versions:
+                if record["Id"] == version_id:
+                    return record
+        return None
+
+
+def serve(org):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status, obj):
+            body = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            org.max_uri_length = max(org.max_uri_length, len(self.path))
+            url = urlparse(self.path)
+            if url.path.startswith(f"{API_PATH}/query"):
+                params = parse_qs(url.query)
+                offset = int(params.get("offset", ["0"])[0])
+                names = re.findall(r"'([^']*)'", params["q"][0])
+                records = [{k: v for k, v in r.items() if k != "Metadata"} for name in names for r in org.versions.get(name, [])]
+                page = {"records": records[offset:offset + QUERY_PAGE_SIZE]}
+                if offset + QUERY_PAGE_SIZE < len(records):
+                    page["nextRecordsUrl"] = f"{url.path}?q={url.query.split('q=')[1].split('&')[0]}&offset={offset + QUERY_PAGE_SIZE}"
+                self.send_json(200, page)
+            elif url.path.startswith(f"{API_PATH}/sobjects/Flow/"):
+                record = org.find(unquote(url.path.rsplit('/', 1)[1]))
+                if record is None:
+                    self.send_json(404, [{"message": "not found", "errorCode": "NOT_FOUND"}])
+                else:
+                    # The real API returns unset fields as null
+                    self.send_json(200, {"Id": record["Id"], "Metadata": dict(record["Metadata"], interviewLabel=None)})
+            else:
+                self.send_json(404, [{"message": "unknown resource", "errorCode": "NOT_FOUND"}])
+
+        def do_POST(self):
+            with org.lock:
+                org.in_flight += 1
+                org.max_in_flight = max(org.max_in_flight, org.in_flight)
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(0.02)
+            responses = []
+            for request in body["compositeRequest"]:
+                if request["method"] == "PATCH":
+                    org.activate(request["url"].rsplit('/', 1)[1], request["body"]["Metadata"]["activeVersionNumber"])
+                    responses.append({"referenceId": request["referenceId"], "httpStatusCode": 204, "body": None})
+                    continue
+                record = org.add_version(request["body"]["FullName"], request["body"]["Metadata"])
+                with org.lock:
+                    org.created.append(request["body"]["FullName"])
+                responses.append({"referenceId": request["referenceId"], "httpStatusCode": 201,
+                                  "body": {"id": record["Id"], "success": True, "errors": []}})
+            with org.lock:
+                org.in_flight -= 1
+            self.send_json(200, {"compositeResponse": responses})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_backup(backup_dir):
+    flow_dir = os.path.join(backup_dir, "force-app", "main", "default", "flows")
+    os.makedirs(flow_dir)
+    for index in range(FLOW_COUNT):
+        for version in range(1, VERSIONS_PER_FLOW + 1):
+            status = "Active" if version == VERSIONS_PER_FLOW else "Obsolete"
+            data = {"Id": f"old{index}_{version}", "FullName": f"Flow_{index}", "Metadata": flow_metadata(index, version, status)}
+            with open(os.path.join(flow_dir, f"Flow_{index}-{version}.flow.json"), "w") as file:
+                json.dump(data, file, indent=4)
+    with open(os.path.join(flow_dir, "No_Metadata-1.flow.json"), "w") as file:
+        json.dump({"Id": "x"}, file)
+
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+    print(f"ok: {message}")
+
+
+def restore(manager, backup_path, activate=False):
+    started = time.time()
+    plan = manager.plan_restore(backup_path)
+    results = manager.restore_plan(plan, activate=activate)
+    return plan, results, time.time() - started
+
+
+def main():
+    org = MockOrg()
+    for index in range(FLOW_COUNT):
+        api_name = f"Flow_{index}"
+        if api_name != DELETED_FLOW:
+            status = "Obsolete" if api_name in INACTIVE_FLOWS else "Active"
+            org.add_version(api_name, flow_metadata(index, VERSIONS_PER_FLOW, status))
+    active_before = org.active_versions()
+    server = serve(org)
+    manager = FlowRestoreManager(f"http://127.0.0.1:{server.server_port}", {"Authorization": "Bearer mock"})
+    expected = (FLOW_COUNT - 1) * (VERSIONS_PER_FLOW - 1) + VERSIONS_PER_FLOW
+    activation_flows = sorted(INACTIVE_FLOWS | {DELETED_FLOW})
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        backup_dir = os.path.join(temp_dir, "backup")
+        write_backup(backup_dir)
+
+        plan, results, elapsed = restore(manager, backup_dir)
+        check(len(plan['versions']) == expected and plan['unchanged'] == FLOW_COUNT - 1,
+              f"planned {len(plan['versions'])} missing versions, {plan['unchanged']} already in the org")
+        check(sum(result['success'] for result in results) == expected, f"restored {expected} versions in {elapsed:.1f}s")
+        check(all(org.created.index(f"Flow_{i + 1}") < org.created.index(f"Flow_{i}") for i in range(FLOW_COUNT - 1) if i % 10 != 9),
+              "subflows were created before the flows calling them")
+        check(org.max_in_flight > 1 and org.max_in_flight <= manager.max_workers,
+              f"at most {org.max_in_flight} composite calls in flight")
+        check(org.max_uri_length < MAX_URI_LENGTH, f"longest request URI was {org.max_uri_length} characters")
+        check(plan['activation_flows'] == activation_flows, f"{len(activation_flows)} flows without an active version were offered for reactivation")
+        active_after = org.active_versions()
+        check(all(active_after[name] == versions for name, versions in active_before.items()) and not active_after[DELETED_FLOW],
+              "restored versions were created as Draft and no active version changed")
+
+        plan = manager.plan_restore(backup_dir)
+        check(not plan['versions'] and plan['unchanged'] == FLOW_COUNT * VERSIONS_PER_FLOW and plan['activation_flows'] == activation_flows,
+              "a second plan finds nothing to restore and still offers the reactivations")
+        results = manager.restore_plan(plan, activate=True)
+        active_after = org.active_versions()
+        check(all(result['success'] for result in results) and all(len(active_after[name]) == 1 for name in activation_flows)
+              and all(active_after[name] == versions for name, versions in active_before.items() if name not in INACTIVE_FLOWS),
+              "opting in reactivated exactly those flows")
+
+        plan = manager.plan_restore(backup_dir)
+        check(not plan['versions'] and not plan['activation_flows'], "a third plan has nothing left to do")
+
+        archive = shutil.make_archive(os.path.join(temp_dir, "backup"), "zip", backup_dir)
+        plan = manager.plan_restore(archive)
+        check(plan is not None and not plan['versions'] and plan['temp_dir'] is not None, "the zip archive plans the same as the directory")
+        manager.cleanup_plan(plan)
+
+        unsafe = os.path.join(temp_dir, "unsafe.tar")
+        with tarfile.open(unsafe, "w") as archive:
+            archive.add(os.path.join(backup_dir, "force-app", "main", "default", "flows", "Flow_0-1.flow.json"), arcname="../escaped.flow.json")
+        plan = manager.plan_restore(unsafe)
+        check(plan is None and not os.path.exists(os.path.join(tempfile.gettempdir(), "escaped.flow.json")),
+              "a tar member outside the archive root is refused")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()